@@ -10,6 +10,9 @@ setup(
         ],
     },
     install_requires=[],
+    extras_require={
+        "lxml": ["lxml"],
+    },
     author="endolith",
     author_email="endolith@gmail.com",
     description="Convert SRT files with GPS data to GPX format.",
@@ -21,5 +24,5 @@ setup(
         "License :: CC0 1.0 Universal (CC0 1.0)",
         "Operating System :: OS Independent",
     ],
-    python_requires=">=3.6",
+    python_requires=">=3.7",
 )
@@ -1,45 +1,179 @@
 import argparse
+import calendar
+import concurrent.futures
+import contextlib
+import functools
+import mmap
+import multiprocessing
 import os
+import re
 import shutil
-import xml.etree.ElementTree as ET
+from dataclasses import dataclass, field
 from datetime import datetime
 
+GPX_NAMESPACE = "http://www.topografix.com/GPX/1/1"
+_TRKSEG_TAG = f"{{{GPX_NAMESPACE}}}trkseg"
+_TRKPT_TAG = f"{{{GPX_NAMESPACE}}}trkpt"
+_ELE_TAG = f"{{{GPX_NAMESPACE}}}ele"
+_TIME_TAG = f"{{{GPX_NAMESPACE}}}time"
+
+try:
+    import lxml.etree as ET
+except ImportError:
+    import xml.etree.ElementTree as ET
+
+_MONTHS = {
+    "Jan": 1, "Feb": 2, "Mar": 3, "Apr": 4, "May": 5, "Jun": 6,
+    "Jul": 7, "Aug": 8, "Sep": 9, "Oct": 10, "Nov": 11, "Dec": 12,
+}
+
+# Date line such as "Jul 4, 2024 6:13:17 PM". Like strptime, this ignores
+# case and accepts any run of whitespace where the format has a space.
+_TIMESTAMP = re.compile(
+    r"([a-z]{3})\s+(\d{1,2}),\s+(\d{4})\s+"
+    r"(\d{1,2}):(\d{1,2}):(\d{1,2})\s+([ap]m)",
+    re.ASCII | re.IGNORECASE
+)
+
+# One SRT cue carrying GPS data: the timing line, the date line, and a
+# "lat, lon, elevation m" line, which may be followed by more fields such as
+# the compass heading ("42.85432, -77.99299, 342.2m, 123°"). Cues with only a
+# compass heading don't match.
+# These are bytes patterns, run directly over the memory-mapped file.
+_GPS_CUE = re.compile(
+    rb"-->[^\n]*\n"
+    rb"[ \t]*([^\r\n]*\S)[ \t]*\r?\n"
+    rb"[ \t]*([-+]?(?:\d+(?:\.\d*)?|\.\d+))[ \t]*,"
+    rb"[ \t]*([-+]?(?:\d+(?:\.\d*)?|\.\d+))[ \t]*,"
+    rb"[ \t]*([-+]?(?:\d+(?:\.\d*)?|\.\d+))[ \t]*m?[ \t]*"
+    rb"(?:,[^\r\n]*)?\r?$",
+    re.MULTILINE
+)
+_CUE_ARROW = re.compile(rb"-->")
+
+# The exact layout OpenCamera writes, e.g. "Jul 4, 2024 6:13:17 PM" followed
+# by "42.85432, -77.99299, 342.2m", optionally with the compass heading
+# appended as ", 123°". With no optional whitespace to backtrack over, this
+# matches about twice as fast as the general _GPS_CUE, and any cue it matches
+# is also matched by _GPS_CUE.
+_OPENCAMERA_CUE = re.compile(
+    rb"-->[^\n]*\n"
+    rb"([A-Z][a-z][a-z] \d\d?, \d{4} \d\d?:\d\d:\d\d [AP]M)\r?\n"
+    rb"(-?\d+\.\d+), (-?\d+\.\d+), (-?\d+\.\d+)m(?:,[^\r\n]*)?\r?$",
+    re.MULTILINE
+)
+# Cheap superset of _GPS_CUE: any cue whose third line starts like a number
+# followed by a comma. Compass heading cues don't match.
+_GPS_CUE_CANDIDATE = re.compile(rb"-->[^\n]*\n[^\n]*\n[ \t]*[-+.\d][^,\n]*,")
+
+# Number of track points generate_gpx formats before each write
+_POINTS_PER_WRITE = 4096
+
+
+@dataclass
+class SrtData:
+    """
+    GPS track parsed from an SRT file, stored as one sequence per field.
+
+    Coordinates are kept as the text that appeared in the SRT file, so they
+    are written to the GPX file exactly as recorded with no float round
+    trip.
+
+    Attributes:
+        times (list of str): Date strings as they appear in the SRT file.
+        iso_times (list of str): The same times in ISO 8601 format.
+        lat_text (list of str): Latitudes as they appear in the SRT file.
+        lon_text (list of str): Longitudes as they appear in the SRT file.
+        ele_text (list of str): Elevations in meters, without the unit.
+    """
+    times: list = field(default_factory=list)
+    iso_times: list = field(default_factory=list)
+    lat_text: list = field(default_factory=list)
+    lon_text: list = field(default_factory=list)
+    ele_text: list = field(default_factory=list)
+
+    def __len__(self):
+        return len(self.times)
+
 
 def parse_srt(file_path):
     """
     Parses an SRT file to extract GPS details: time, latitude, longitude, and elevation.
 
+    Each entry's time is also converted to ISO 8601 once here, so later
+    steps don't have to convert it again.
+
     Args:
         file_path (str): Path to the SRT file.
 
     Returns:
-        tuple: A list of valid entries (dict) and a count of skipped invalid entries.
-    """
-    with open(file_path, 'r') as file:
-        lines = file.readlines()
-
-    entries = []
-    skipped = 0
-    for i in range(len(lines)):
-        if '-->' in lines[i]:
-            timestamp = lines[i + 1].strip()
-            location_data = lines[i + 2].strip()
-            try:
-                if ',' in location_data:
-                    lat, lon = map(float, location_data.split(",")[:2])
-                    elevation = location_data.split(
-                        ",")[2].strip().replace("m", "")
-                    entries.append({
-                        "time": timestamp,
-                        "lat": lat,
-                        "lon": lon,
-                        "elevation": float(elevation)
-                    })
-                else:
-                    skipped += 1  # Skip compass heading-only entries
-            except (ValueError, IndexError):
-                skipped += 1
-    return entries, skipped
+        tuple: The valid entries (SrtData) and a count of skipped invalid entries.
+
+    Raises:
+        ValueError: If a GPS entry has a date line that isn't a valid time.
+    """
+    # Memory-map the file and run the regex over its bytes, so only the
+    # captured fields are ever turned into str objects.
+    with open(file_path, 'rb') as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return SrtData(), 0  # mmap can't map an empty file
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as text:
+            # findall builds the row tuples in C, without any per-cue
+            # Python code.
+            rows = _find_gps_cues(text)
+            cues = len(_CUE_ARROW.findall(text))
+
+    # Transpose the rows into columns and decode them one at a time,
+    # replacing each column's bytes as we go, so the bytes and str copies of
+    # the whole table never coexist.
+    columns = _columns(rows)
+    del rows
+    for i, column in enumerate(columns):
+        columns[i] = list(map(bytes.decode, column))
+    times, lats, lons, eles = columns
+    iso_times = list(map(convert_to_iso8601, times))
+
+    data = SrtData(times, iso_times, lats, lons, eles)
+    # Every cue that didn't yield an entry (compass heading only, or invalid)
+    skipped = cues - len(data)
+    return data, skipped
+
+
+def _find_gps_cues(text):
+    """
+    Finds the GPS cues in an SRT file.
+
+    The fast _OPENCAMERA_CUE is tried first. If it matched fewer cues than
+    could possibly hold GPS data, some cue deviates from OpenCamera's exact
+    layout, and the whole file is matched again with the lenient _GPS_CUE so
+    that no track points are lost.
+
+    Args:
+        text (mmap.mmap): Contents of the SRT file.
+
+    Returns:
+        list of tuple: The date, latitude, longitude, and elevation of each
+        GPS cue, as bytes.
+    """
+    rows = _OPENCAMERA_CUE.findall(text)
+    if len(rows) != len(_GPS_CUE_CANDIDATE.findall(text)):
+        rows = _GPS_CUE.findall(text)
+    return rows
+
+
+def _columns(rows):
+    """
+    Transposes regex match rows into one list per captured field.
+
+    Args:
+        rows (list of tuple): Rows of four fields, as returned by findall.
+
+    Returns:
+        list of list: The four columns, which are empty if there are no rows.
+    """
+    if not rows:
+        return [[], [], [], []]
+    return [list(column) for column in zip(*rows)]
 
 
 def convert_to_iso8601(date_str):
@@ -52,49 +186,81 @@ def convert_to_iso8601(date_str):
     Returns:
         str: ISO 8601 formatted string.
     """
-    try:
-        parsed_time = datetime.strptime(date_str, "%b %d, %Y %I:%M:%S %p")
-        return parsed_time.strftime("%Y-%m-%dT%H:%M:%SZ")
-    except ValueError:
+    # Hand-rolled equivalent of strptime(date_str, "%b %d, %Y %I:%M:%S %p"),
+    # which is much slower than matching the fixed OpenCamera layout.
+    match = _TIMESTAMP.fullmatch(date_str)
+    if not match:
         raise ValueError(f"Invalid time format: {date_str}")
+    month, day, year, hour, minute, second, am_pm = match.groups()
+    month = _MONTHS.get(month.title())
+    year, day, hour, minute, second = map(int, (year, day, hour, minute,
+                                                second))
+    # Every month has at least 28 days, so only look up the rest.
+    valid_date = (month is not None and 1 <= year <= 9999 and 1 <= day
+                  and (day <= 28
+                       or day <= calendar.monthrange(year, month)[1]))
+    valid_time = 1 <= hour <= 12 and minute <= 59 and second <= 59
+    if not (valid_date and valid_time):
+        raise ValueError(f"Invalid time format: {date_str}")
+    hour %= 12
+    if am_pm.upper() == "PM":
+        hour += 12
+    # %-formatting is about twice as fast as the equivalent f-string with
+    # :02d specs, and skips building a datetime just to run it through
+    # strftime.
+    return "%04d-%02d-%02dT%02d:%02d:%02dZ" % (year, month, day,
+                                              hour, minute, second)
 
 
 def generate_gpx(data, output_file):
     """
     Generates a GPX file from parsed SRT data.
 
+    The XML is streamed to the file a block of track points at a time rather
+    than built as an element tree first, so memory use does not grow with
+    the length of the track.
+
     Args:
-        data (list of dict): Parsed SRT data.
+        data (SrtData): Parsed SRT data.
         output_file (str): Path to save the GPX file.
     """
-    gpx = ET.Element(
-        "gpx",
-        version="1.1",
-        creator="srt-to-gpx",
-        xmlns="http://www.topografix.com/GPX/1/1",
-    )
-
-    # Add metadata
-    metadata = ET.SubElement(gpx, "metadata")
-    ET.SubElement(metadata, "name").text = "OpenCamera SRT to GPX conversion"
-    ET.SubElement(metadata, "desc").text = ("Converted from OpenCamera SRT file using srt-to-gpx\n"
-                                            "https://github.com/endolith/srt-to-gpx")
-    ET.SubElement(metadata, "author").text = "srt-to-gpx"
-    ET.SubElement(metadata, "time").text = datetime.utcnow().strftime(
-        "%Y-%m-%dT%H:%M:%SZ")
-
-    trk = ET.SubElement(gpx, "trk")
-    trkseg = ET.SubElement(trk, "trkseg")
-
-    for entry in data:
-        trkpt = ET.SubElement(trkseg, "trkpt", lat=str(
-            entry["lat"]), lon=str(entry["lon"]))
-        ET.SubElement(trkpt, "ele").text = str(entry["elevation"])
-        ET.SubElement(trkpt, "time").text = convert_to_iso8601(entry["time"])
-
-    tree = ET.ElementTree(gpx)
-    ET.indent(tree)
-    tree.write(output_file, encoding="utf-8", xml_declaration=True)
+    now = datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ")
+    with open(output_file, "wb") as file:
+        file.write(
+            "<?xml version='1.0' encoding='utf-8'?>\n"
+            f'<gpx version="1.1" creator="srt-to-gpx" xmlns="{GPX_NAMESPACE}">\n'
+            "  <metadata>\n"
+            "    <name>OpenCamera SRT to GPX conversion</name>\n"
+            "    <desc>Converted from OpenCamera SRT file using srt-to-gpx\n"
+            "https://github.com/endolith/srt-to-gpx</desc>\n"
+            "    <author>srt-to-gpx</author>\n"
+            f"    <time>{now}</time>\n"
+            "  </metadata>\n"
+            "  <trk>\n"
+            "    <trkseg>\n".encode()
+        )
+
+        # Track points are formatted into a bytearray and written a block at
+        # a time, so there is one write() per block rather than per point.
+        columns = (data.lat_text, data.lon_text, data.ele_text, data.iso_times)
+        for start in range(0, len(data), _POINTS_PER_WRITE):
+            block = bytearray()
+            for lat, lon, ele, iso_time in zip(
+                    *(column[start:start + _POINTS_PER_WRITE]
+                      for column in columns)):
+                block += (
+                    f'      <trkpt lat="{lat}" lon="{lon}">\n'
+                    f'        <ele>{ele}</ele>\n'
+                    f'        <time>{iso_time}</time>\n'
+                    "      </trkpt>\n".encode()
+                )
+            file.write(block)
+
+        file.write(
+            "    </trkseg>\n"
+            "  </trk>\n"
+            "</gpx>".encode()
+        )
 
 
 def validate_conversion(srt_data, gpx_file):
@@ -102,30 +268,43 @@ def validate_conversion(srt_data, gpx_file):
     Validates that the GPX file matches the original SRT data.
 
     Args:
-        srt_data (list of dict): Original parsed SRT data.
+        srt_data (SrtData): Original parsed SRT data.
         gpx_file (str): Path to the GPX file.
 
     Raises:
         AssertionError: If validation fails.
     """
-    tree = ET.parse(gpx_file)
-    root = tree.getroot()
-    namespace = {"ns": "http://www.topografix.com/GPX/1/1"}
-
-    trkpts = root.findall(".//ns:trkpt", namespace)
-    assert len(srt_data) == len(trkpts), "Mismatch in number of points."
-
-    for srt_point, trkpt in zip(srt_data, trkpts):
-        lat = float(trkpt.get("lat"))
-        lon = float(trkpt.get("lon"))
-        ele = float(trkpt.find("ns:ele", namespace).text)
-        time = trkpt.find("ns:time", namespace).text
-
-        assert (srt_point["lat"], srt_point["lon"]) == (
+    # Track points are checked as they are parsed and then removed from their
+    # <trkseg>, so the document is never held in memory as a whole.
+    # generate_gpx always writes <ele> then <time>, so the children are read
+    # by position.
+    i = 0
+    trkseg = None
+    for event, elem in ET.iterparse(gpx_file, events=("start", "end")):
+        if event == "start":
+            if elem.tag == _TRKSEG_TAG:
+                trkseg = elem
+            continue
+        if elem.tag != _TRKPT_TAG:
+            continue
+        trkpt = elem
+        assert i < len(srt_data), "Mismatch in number of points."
+        lat = trkpt.get("lat")
+        lon = trkpt.get("lon")
+        ele_elem, time_elem = trkpt
+        assert ele_elem.tag == _ELE_TAG and time_elem.tag == _TIME_TAG, \
+            "Unexpected track point layout."
+
+        assert (srt_data.lat_text[i], srt_data.lon_text[i]) == (
             lat, lon), "Mismatch in coordinates."
-        assert srt_point["elevation"] == ele, "Mismatch in elevation."
-        assert convert_to_iso8601(
-            srt_point["time"]) == time, "Mismatch in time."
+        assert srt_data.ele_text[i] == ele_elem.text, "Mismatch in elevation."
+        assert srt_data.iso_times[i] == time_elem.text, "Mismatch in time."
+        if trkseg is not None:
+            trkseg.remove(trkpt)
+        else:
+            trkpt.clear()
+        i += 1
+    assert i == len(srt_data), "Mismatch in number of points."
 
 
 def set_file_modification_time(gpx_file, reference_file):
@@ -140,6 +319,60 @@ def set_file_modification_time(gpx_file, reference_file):
     os.utime(gpx_file, (ref_stat.st_atime, ref_stat.st_mtime))
 
 
+def gpx_path(srt_file, output_dir):
+    """
+    Returns the path of the GPX file that an SRT file is converted to.
+
+    Args:
+        srt_file (str): Path to the SRT file.
+        output_dir (str): Directory to save the GPX file.
+
+    Returns:
+        str: Path of the GPX file.
+    """
+    stem, _ = os.path.splitext(os.path.basename(srt_file))
+    return os.path.join(output_dir, stem + ".gpx")
+
+
+def convert_file(srt_file, output_dir, validate=False):
+    """
+    Converts a single SRT file to a GPX file in the output directory.
+
+    Errors are reported in the returned text rather than raised, so that one
+    bad file doesn't stop a batch.
+
+    Args:
+        srt_file (str): Path to the SRT file.
+        output_dir (str): Directory to save the GPX file.
+        validate (bool): Whether to read the GPX file back and check it
+            against the SRT data.
+
+    Returns:
+        tuple: Progress messages for this file (str) and the path of the GPX
+        file written, or None if the conversion didn't succeed.
+    """
+    messages = [f"\nProcessing {srt_file}..."]
+    try:
+        srt_data, skipped = parse_srt(srt_file)
+
+        if not srt_data:
+            messages.append(f"No GPS data found in file: {srt_file}. Only "
+                            "compass headings or invalid entries were present.")
+            return "\n".join(messages), None
+
+        output_file = gpx_path(srt_file, output_dir)
+        generate_gpx(srt_data, output_file)
+        if validate:
+            validate_conversion(srt_data, output_file)
+
+        messages.append(f"Successfully converted {srt_file} to {output_file}")
+        messages.append(f"Skipped {skipped} invalid or non-GPS entries.")
+        return "\n".join(messages), output_file
+    except Exception as e:
+        messages.append(f"Error processing {srt_file}: {e}")
+        return "\n".join(messages), None
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="Convert SRT files with GPS data to GPX format."
@@ -155,32 +388,47 @@ def main():
         dest="no_match_time",
         help="Do not set the GPX file's modification time to match the SRT file. By default, it is matched."
     )
+    parser.add_argument(
+        "--validate", action="store_true",
+        help="Read each GPX file back after writing it and check that it matches the SRT data."
+    )
     args = parser.parse_args()
 
-    for srt_file in args.input_files:
-        try:
-            print(f"\nProcessing {srt_file}...")
-            srt_data, skipped = parse_srt(srt_file)
-
-            if not srt_data:
-                print(f"No GPS data found in file: {srt_file}. Only compass "
-                      "headings or invalid entries were present.")
-                continue
-
-            output_file = os.path.join(
-                args.output_dir, os.path.basename(
-                    srt_file).replace(".srt", ".gpx")
-            )
-            generate_gpx(srt_data, output_file)
-            validate_conversion(srt_data, output_file)
-
-            if not args.no_match_time:
-                set_file_modification_time(output_file, srt_file)
-
-            print(f"Successfully converted {srt_file} to {output_file}")
-            print(f"Skipped {skipped} invalid or non-GPS entries.")
-        except Exception as e:
-            print(f"Error processing {srt_file}: {e}")
+    convert = functools.partial(convert_file, output_dir=args.output_dir,
+                                validate=args.validate)
+    # Files are independent, so convert them in parallel. imap keeps the
+    # reports in the order the files were given. If two inputs share a base
+    # name they would write the same GPX file at once, so convert the batch
+    # serially instead and let the last one win.
+    gpx_files = {os.path.normcase(os.path.abspath(gpx_path(srt_file,
+                                                           args.output_dir)))
+                 for srt_file in args.input_files}
+    processes = min(len(args.input_files), os.cpu_count() or 1)
+    parallel = processes > 1 and len(gpx_files) == len(args.input_files)
+    output_files = []
+    with (multiprocessing.Pool(processes) if parallel
+          else contextlib.nullcontext()) as pool:
+        results = (pool.imap(convert, args.input_files) if parallel
+                   else map(convert, args.input_files))
+        for report, output_file in results:
+            print(report)
+            output_files.append(output_file)
+
+    if not args.no_match_time:
+        # Only syscalls are left to do, so overlap them in threads. A GPX file
+        # written more than once takes its time from the last input.
+        sources = {output_file: srt_file for srt_file, output_file
+                   in zip(args.input_files, output_files) if output_file}
+        with concurrent.futures.ThreadPoolExecutor() as executor:
+            futures = {
+                executor.submit(set_file_modification_time, output_file,
+                                srt_file): srt_file
+                for output_file, srt_file in sources.items()
+            }
+            for future in concurrent.futures.as_completed(futures):
+                if future.exception() is not None:
+                    print(f"Error setting modification time for "
+                          f"{futures[future]}: {future.exception()}")
 
 
 if __name__ == "__main__":